@@ -6,7 +6,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # Optional accelerators from requirements-fast.txt, imported lazily; missing ones are skipped with a warning.
+    hiddenimports=['services.period_codes', 'pyarrow.csv', 'pyarrow.compute', 'numba', 'numpy', 'ahocorasick'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
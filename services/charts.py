@@ -13,10 +13,8 @@ def build_bar_chart(data: List[Tuple[str, float]], title: str) -> QChartView:
 
     series = QBarSeries()
     bar_set = QBarSet("Total")
-    categories = []
-    for label, value in data:
-        categories.append(label)
-        bar_set.append(float(value))
+    categories = [label for label, _ in data]
+    bar_set.append([float(value) for _, value in data])
     series.append(bar_set)
     chart.addSeries(series)
 
@@ -3,21 +3,45 @@ from __future__ import annotations
 import csv
 import os
 import re
-from typing import Dict, Iterable, List, Optional, Tuple
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from PyQt6.QtSql import QSqlDatabase, QSqlQuery
 
 from services.database import (
+    apply_pragmas,
     ensure_columns,
     find_standard_columns,
+    load_imported_periods,
     register_imported_periods,
     sanitize_column,
 )
 
+if TYPE_CHECKING:
+    import numpy as np
+    import pyarrow as pa
+
+BATCH_SIZE = 500
+# Applied for the duration of an insert and restored afterwards. The rollback journal stays on disk,
+# so a crash mid-import still rolls back cleanly; with synchronous OFF a power loss can at worst
+# lose the last import, which only means importing the file again.
+BULK_IMPORT_PRAGMAS = {
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "locking_mode": "EXCLUSIVE",
+}
+# Below this many rows the JIT compile costs more than the Python loop it replaces.
+NUMBA_MIN_ROWS = 5000
+
+# One prepared INSERT per connection and header layout, reused by every later import.
+_prepared_inserts: Dict[Tuple[str, Tuple[str, ...]], QSqlQuery] = {}
+
+_FILENAME_PERIOD = re.compile(r"(20\d{2}).?([01]?\d)")
+
 
 def _extract_periods_from_filename(path: str) -> List[Tuple[int, int]]:
     name = os.path.basename(path)
-    matches = re.findall(r"(20\d{2}).?([01]?\d)", name)
+    matches = _FILENAME_PERIOD.findall(name)
     periods: List[Tuple[int, int]] = []
     for year_str, month_str in matches:
         year = int(year_str)
@@ -27,45 +51,23 @@ def _extract_periods_from_filename(path: str) -> List[Tuple[int, int]]:
     return periods
 
 
-def _extract_periods_from_rows(rows: Iterable[Dict[str, str]], mapping: Dict[str, Optional[str]]) -> List[Tuple[int, int]]:
-    year_col = mapping.get("year")
-    month_col = mapping.get("month")
-    if not year_col or not month_col:
+def _extract_periods_from_rows(
+    rows: Iterable[List[str]], year_idx: Optional[int], month_idx: Optional[int]
+) -> List[Tuple[int, int]]:
+    if year_idx is None or month_idx is None:
         return []
     periods = set()
     for row in rows:
-        try:
-            year = int(str(row.get(year_col, "")).strip())
-            month = int(str(row.get(month_col, "")).strip())
-        except ValueError:
-            continue
-        if 1 <= month <= 12:
-            periods.add((year, month))
+        period = _parse_row_period(row, year_idx, month_idx)
+        if period:
+            periods.add(period)
     return sorted(periods)
 
 
-def _load_imported_periods(db: QSqlDatabase) -> set[Tuple[int, int]]:
-    query = QSqlQuery(db)
-    query.exec("SELECT year, month FROM imported_periods")
-    periods: set[Tuple[int, int]] = set()
-    while query.next():
-        year = query.value(0)
-        month = query.value(1)
-        if year is None or month is None:
-            continue
-        try:
-            periods.add((int(year), int(month)))
-        except (TypeError, ValueError):
-            continue
-    return periods
-
-
-def _parse_row_period(row: Dict[str, str], year_key: Optional[str], month_key: Optional[str]) -> Optional[Tuple[int, int]]:
-    if not year_key or not month_key:
-        return None
+def _parse_period(year_value: Any, month_value: Any) -> Optional[Tuple[int, int]]:
     try:
-        year = int(str(row.get(year_key, "")).strip())
-        month = int(str(row.get(month_key, "")).strip())
+        year = int(str(year_value).strip())
+        month = int(str(month_value).strip())
     except ValueError:
         return None
     if 1 <= month <= 12:
@@ -73,68 +75,147 @@ def _parse_row_period(row: Dict[str, str], year_key: Optional[str], month_key: O
     return None
 
 
+def _load_period_codes() -> Optional[ModuleType]:
+    # pyarrow, numpy and numba take longer to import than the rest of the app to start,
+    # so they are only loaded once an import is big enough to use them.
+    try:
+        from services import period_codes
+    except ImportError:
+        return None
+    return period_codes
+
+
+def _parse_row_period(row: List[str], year_idx: Optional[int], month_idx: Optional[int]) -> Optional[Tuple[int, int]]:
+    if year_idx is None or month_idx is None or max(year_idx, month_idx) >= len(row):
+        return None
+    return _parse_period(row[year_idx], row[month_idx])
+
+
+def _skip_imported_rows(
+    rows: Iterable[List[str]], year_idx: int, month_idx: int, imported_periods: set[Tuple[int, int]]
+) -> Iterator[List[str]]:
+    for row in rows:
+        if _parse_row_period(row, year_idx, month_idx) not in imported_periods:
+            yield row
+
+
 def import_csv(db: QSqlDatabase, path: str) -> Tuple[int, List[Tuple[int, int]]]:
-    handle = None
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return _import_csv_rows(db, path)
+    try:
+        table = _read_arrow_table(path)
+    except pa.ArrowInvalid:
+        # Ragged or otherwise malformed files are left to the tolerant csv module.
+        return _import_csv_rows(db, path)
+    if table is None:
+        return 0, []
+    return _import_arrow_table(db, path, table)
+
+
+def _read_arrow_table(path: str) -> Optional[pa.Table]:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    last_error: Optional[UnicodeDecodeError] = None
+    for encoding in ("utf-8-sig", "latin-1"):
+        try:
+            with open(path, "r", encoding=encoding, newline="") as handle:
+                header = next(csv.reader(handle, delimiter=";"), None)
+            if not header:
+                return None
+            # Keep every cell as text, exactly as the csv module would hand it over.
+            return pa_csv.read_csv(
+                path,
+                read_options=pa_csv.ReadOptions(encoding=encoding),
+                parse_options=pa_csv.ParseOptions(delimiter=";"),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={name: pa.string() for name in header},
+                    strings_can_be_null=False,
+                ),
+            )
+        except UnicodeDecodeError as exc:
+            last_error = exc
+            continue
+
+    if last_error:
+        raise last_error
+    return None
+
+
+def _import_arrow_table(db: QSqlDatabase, path: str, table: pa.Table) -> Tuple[int, List[Tuple[int, int]]]:
+    import pyarrow as pa
+
+    original_headers = [h.strip() for h in table.column_names]
+    sanitized_headers = [sanitize_column(h) for h in original_headers]
+    ensure_columns(db, sanitized_headers)
+    columns, col_order = _column_order(sanitized_headers)
+
+    standard_mapping = find_standard_columns(sanitized_headers)
+    year_col = standard_mapping.get("year")
+    month_col = standard_mapping.get("month")
+
+    has_period_columns = bool(year_col and month_col)
+    row_periods: List[Optional[Tuple[int, int]]] = []
+    row_codes: Optional[np.ndarray] = None
+    distinct_periods: List[Tuple[int, int]] = []
+    if has_period_columns:
+        years = table.column(sanitized_headers.index(year_col))
+        months = table.column(sanitized_headers.index(month_col))
+        period_codes = _load_period_codes() if table.num_rows >= NUMBA_MIN_ROWS else None
+        if period_codes is not None:
+            row_codes = period_codes.period_codes(years, months)
+        if row_codes is not None:
+            codes = period_codes.distinct_period_codes(row_codes[row_codes != period_codes.INVALID_PERIOD])
+            distinct_periods = [(int(code) // 12, int(code) % 12 + 1) for code in codes]
+        else:
+            row_periods = [_parse_period(y, m) for y, m in zip(years.to_pylist(), months.to_pylist())]
+            distinct_periods = sorted({p for p in row_periods if p})
+    periods = distinct_periods or _extract_periods_from_filename(path)
+    imported_periods = load_imported_periods(db)
+
+    if has_period_columns:
+        new_periods = distinct_periods
+        if not imported_periods.isdisjoint(distinct_periods):
+            if row_codes is not None:
+                keep = period_codes.rows_outside(row_codes, imported_periods)
+            else:
+                keep = [p not in imported_periods for p in row_periods]
+            table = table.filter(pa.array(keep))
+            new_periods = [p for p in distinct_periods if p not in imported_periods]
+        if table.num_rows == 0:
+            return 0, periods
+        inserted = _insert_table(db, table.select(col_order), columns)
+        if new_periods:
+            register_imported_periods(db, new_periods)
+        return inserted, periods
+
+    if periods and not imported_periods.isdisjoint(periods):
+        return 0, periods
+
+    inserted = _insert_table(db, table.select(col_order), columns)
+    if periods:
+        register_imported_periods(db, periods)
+    return inserted, periods
+
+
+def _column_order(sanitized_headers: List[str]) -> Tuple[List[str], List[int]]:
+    """Return the exams columns to fill and, for each one, the CSV position it is read from."""
+    positions: Dict[str, int] = {}
+    for idx, name in enumerate(sanitized_headers):
+        if name != "id":
+            positions.setdefault(name, idx)
+    return list(positions), list(positions.values())
+
+
+def _import_csv_rows(db: QSqlDatabase, path: str) -> Tuple[int, List[Tuple[int, int]]]:
     last_error: Optional[UnicodeDecodeError] = None
     for encoding in ("utf-8-sig", "latin-1"):
         try:
-            handle = open(path, "r", encoding=encoding, newline="")
-            reader = csv.DictReader(handle, delimiter=";")
-            if not reader.fieldnames:
-                handle.close()
-                return 0, []
-            original_headers = [h.strip() for h in reader.fieldnames]
-            sanitized_headers = [sanitize_column(h) for h in original_headers]
-
-            mapping = {orig: sanitized for orig, sanitized in zip(original_headers, sanitized_headers)}
-            ensure_columns(db, sanitized_headers)
-
-            rows = list(reader)
-            standard_mapping = find_standard_columns(sanitized_headers)
-            rows_sanitized = [{mapping.get(k, k): v for k, v in row.items()} for row in rows]
-            periods = _extract_periods_from_rows(rows_sanitized, standard_mapping)
-            if not periods:
-                periods = _extract_periods_from_filename(path)
-
-            year_col = standard_mapping.get("year")
-            month_col = standard_mapping.get("month")
-            imported_periods = _load_imported_periods(db)
-
-            if year_col and month_col:
-                reverse_mapping = {san: orig for orig, san in mapping.items()}
-                year_key = reverse_mapping.get(year_col, year_col)
-                month_key = reverse_mapping.get(month_col, month_col)
-                new_rows: List[Dict[str, str]] = []
-                new_periods: set[Tuple[int, int]] = set()
-                for row in rows:
-                    period = _parse_row_period(row, year_key, month_key)
-                    if period and period in imported_periods:
-                        continue
-                    new_rows.append(row)
-                    if period:
-                        new_periods.add(period)
-                if not new_rows:
-                    handle.close()
-                    return 0, periods
-                inserted = _insert_rows(db, new_rows, mapping)
-                if new_periods:
-                    register_imported_periods(db, sorted(new_periods))
-                handle.close()
-                return inserted, periods
-
-            if periods and any((y, m) in imported_periods for y, m in periods):
-                handle.close()
-                return 0, periods
-
-            inserted = _insert_rows(db, rows, mapping)
-            if periods:
-                register_imported_periods(db, periods)
-            handle.close()
-            return inserted, periods
+            return _import_csv_stream(db, path, encoding)
         except UnicodeDecodeError as exc:
             last_error = exc
-            if handle:
-                handle.close()
             continue
 
     if last_error:
@@ -142,28 +223,125 @@ def import_csv(db: QSqlDatabase, path: str) -> Tuple[int, List[Tuple[int, int]]]
     return 0, []
 
 
-def _insert_rows(db: QSqlDatabase, rows: List[Dict[str, str]], mapping: Dict[str, str]) -> int:
-    if not rows:
-        return 0
-    keys = list(rows[0].keys())
-    columns = [mapping[key] for key in keys]
+def _import_csv_stream(db: QSqlDatabase, path: str, encoding: str) -> Tuple[int, List[Tuple[int, int]]]:
+    # First pass: only the header and the year/month cells are looked at.
+    with open(path, "r", encoding=encoding, newline="") as handle:
+        reader = csv.reader(handle, delimiter=";")
+        header = next(reader, None)
+        if not header:
+            return 0, []
+        sanitized_headers = [sanitize_column(h.strip()) for h in header]
+        ensure_columns(db, sanitized_headers)
+
+        standard_mapping = find_standard_columns(sanitized_headers)
+        year_col = standard_mapping.get("year")
+        month_col = standard_mapping.get("month")
+        year_idx = sanitized_headers.index(year_col) if year_col and month_col else None
+        month_idx = sanitized_headers.index(month_col) if year_col and month_col else None
+        row_periods = _extract_periods_from_rows(reader, year_idx, month_idx)
+
+    periods = row_periods or _extract_periods_from_filename(path)
+    imported_periods = load_imported_periods(db)
+
+    if year_idx is None and periods and not imported_periods.isdisjoint(periods):
+        return 0, periods
+
+    # Second pass: stream the rows straight into batched inserts.
+    with open(path, "r", encoding=encoding, newline="") as handle:
+        reader = csv.reader(handle, delimiter=";")
+        next(reader, None)
+        rows: Iterable[List[str]] = reader
+        if year_idx is not None and not imported_periods.isdisjoint(row_periods):
+            rows = _skip_imported_rows(reader, year_idx, month_idx, imported_periods)
+        columns, col_order = _column_order(sanitized_headers)
+        inserted = _insert_rows(db, rows, columns, col_order)
+
+    if year_idx is not None:
+        new_periods = [p for p in row_periods if p not in imported_periods]
+        if new_periods:
+            register_imported_periods(db, new_periods)
+    elif periods:
+        register_imported_periods(db, periods)
+    return inserted, periods
+
+
+def _prepare_insert(db: QSqlDatabase, columns: List[str]) -> QSqlQuery:
+    key = (db.connectionName(), tuple(columns))
+    query = _prepared_inserts.get(key)
+    if query is not None:
+        return query
     placeholders = ", ".join(["?"] * len(columns))
     col_sql = ", ".join([f'"{col}"' for col in columns])
-    sql = f'INSERT INTO exams ({col_sql}) VALUES ({placeholders})'
     query = QSqlQuery(db)
-    query.prepare(sql)
+    if not query.prepare(f'INSERT INTO exams ({col_sql}) VALUES ({placeholders})'):
+        # Raised rather than returning no rows, so the file's periods are never registered without their data.
+        raise RuntimeError(f"Could not prepare insert: {query.lastError().text()}")
+    _prepared_inserts[key] = query
+    return query
+
+
+def _exec_batch(query: QSqlQuery, cols_values: List[List[Any]]) -> bool:
+    for values in cols_values:
+        query.addBindValue(values)
+    return query.execBatch(QSqlQuery.BatchExecutionMode.ValuesAsRows)
+
+
+def _restore_pragmas(db: QSqlDatabase, previous: Dict[str, str]) -> None:
+    apply_pragmas(db, previous)
+    # Going back to NORMAL locking only drops the exclusive lock on the next access to the file.
+    QSqlQuery("SELECT 1 FROM sqlite_master LIMIT 1", db)
+
+
+def _insert_table(db: QSqlDatabase, table: pa.Table, columns: List[str]) -> int:
+    query = _prepare_insert(db, columns)
     count = 0
-    total = len(rows)
-    print(f"Importing {total} rows...")
-    use_tx = db.transaction()
-    for idx, row in enumerate(rows, start=1):
-        for i, key in enumerate(keys):
-            query.bindValue(i, row.get(key))
-        if query.exec():
-            count += 1
-        if idx % 1000 == 0 or idx == total:
-            print(f"Processed {idx}/{total} rows...")
-    if use_tx:
-        if not db.commit():
-            db.rollback()
+    previous = apply_pragmas(db, BULK_IMPORT_PRAGMAS)
+    try:
+        use_tx = db.transaction()
+        for batch in table.to_batches(max_chunksize=BATCH_SIZE):
+            if _exec_batch(query, [column.to_pylist() for column in batch.columns]):
+                count += batch.num_rows
+        if use_tx:
+            if not db.commit():
+                db.rollback()
+    finally:
+        _restore_pragmas(db, previous)
+    return count
+
+
+def _insert_rows(db: QSqlDatabase, rows: Iterable[List[str]], columns: List[str], col_order: List[int]) -> int:
+    query = _prepare_insert(db, columns)
+    width = max(col_order, default=-1) + 1
+    count = 0
+    previous = apply_pragmas(db, BULK_IMPORT_PRAGMAS)
+    try:
+        use_tx = db.transaction()
+        try:
+            cols_values: List[List[Any]] = [[] for _ in columns]
+            pending = 0
+            for row in rows:
+                if not row:
+                    continue
+                if len(row) < width:
+                    row.extend([None] * (width - len(row)))
+                for values, j in zip(cols_values, col_order):
+                    values.append(row[j])
+                pending += 1
+                if pending == BATCH_SIZE:
+                    if _exec_batch(query, cols_values):
+                        count += pending
+                    cols_values = [[] for _ in columns]
+                    pending = 0
+            if pending and _exec_batch(query, cols_values):
+                count += pending
+        except Exception:
+            # A decode error halfway through must not leave a partial import behind.
+            if use_tx:
+                db.rollback()
+            raise
+        if use_tx:
+            if not db.commit():
+                db.rollback()
+    finally:
+        _restore_pragmas(db, previous)
     return count
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import os
 import re
 from typing import Dict, Iterable, List, Optional, Tuple
@@ -7,6 +8,64 @@ from typing import Dict, Iterable, List, Optional, Tuple
 from PyQt6.QtCore import QStandardPaths
 from PyQt6.QtSql import QSqlDatabase, QSqlQuery
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+_ACCENT_TABLE = str.maketrans("áéíóú", "aeiou")
+_NON_WORD = re.compile(r"[^\w]+")
+_MULTI_UNDERSCORE = re.compile(r"_+")
+
+CONNECTION_PRAGMAS = {"cache_size": "-64000", "mmap_size": "268435456", "temp_store": "MEMORY"}
+
+# Header substrings for each standard column, in priority order.
+_STANDARD_PATTERNS: Dict[str, Tuple[str, ...]] = {
+    "month": ("mes", "month"),
+    "year": ("anyo", "anio", "año", "year"),
+    "province": ("desc_provincia", "prov", "provincia"),
+    "exam_center": ("centro_examen", "exam_center", "centro"),
+    "exam_type": ("tipo_examen", "exam_type", "prueba", "tipo"),
+    "driving_school": ("nombre_autoescuela", "autoescuela", "driving_school", "escuela"),
+    "permit": ("nombre_permiso", "permiso"),
+    "num_aptos": ("num_aptos",),
+    "num_no_aptos": ("num_no_aptos",),
+}
+
+# Columns SQLite derives from a standard column, as (name, declared type, expression). They are
+# VIRTUAL, so imports write nothing extra, and indexed, so filters on them are index searches.
+DERIVED_COLUMNS: Dict[str, Tuple[str, str, str]] = {
+    "year": ("year_i", "INTEGER", 'CAST("{col}" AS INTEGER)'),
+    "month": ("month_i", "INTEGER", 'CAST("{col}" AS INTEGER)'),
+    "province": ("province_norm", "TEXT COLLATE NOCASE", 'TRIM("{col}")'),
+    "exam_center": ("exam_center_norm", "TEXT COLLATE NOCASE", 'TRIM("{col}")'),
+    "exam_type": ("exam_type_norm", "TEXT COLLATE NOCASE", 'TRIM("{col}")'),
+    "driving_school": ("driving_school_norm", "TEXT COLLATE NOCASE", 'TRIM("{col}")'),
+    "permit": ("permit_norm", "TEXT COLLATE NOCASE", 'TRIM("{col}")'),
+}
+
+
+def _build_pattern_automaton():
+    targets: Dict[str, List[Tuple[str, int]]] = {}
+    for name, patterns in _STANDARD_PATTERNS.items():
+        for priority, pattern in enumerate(patterns):
+            targets.setdefault(pattern, []).append((name, priority))
+    automaton = ahocorasick.Automaton()
+    for pattern, pattern_targets in targets.items():
+        automaton.add_word(pattern, pattern_targets)
+    automaton.make_automaton()
+    return automaton
+
+
+# Scans each header once for every pattern instead of testing the patterns one by one.
+_PATTERN_AUTOMATON = _build_pattern_automaton() if ahocorasick is not None else None
+
+# Monthly exports share the same header layout, so matches are reused per header tuple.
+_standard_columns_cache: Dict[Tuple[str, ...], Dict[str, Optional[str]]] = {}
+
+# Columns of the exams table per database file, kept in step by ensure_columns.
+_exams_columns: Dict[str, List[str]] = {}
+
 
 def get_database_path() -> str:
     data_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)
@@ -22,10 +81,22 @@ def open_database() -> QSqlDatabase:
     db.setDatabaseName(db_path)
     if not db.open():
         raise RuntimeError(f"Failed to open database at {db_path}")
+    apply_pragmas(db, CONNECTION_PRAGMAS)
     _ensure_base_tables(db)
     return db
 
 
+def apply_pragmas(db: QSqlDatabase, pragmas: Dict[str, str]) -> Dict[str, str]:
+    """Set the given PRAGMAs and return their previous values so they can be restored."""
+    query = QSqlQuery(db)
+    previous: Dict[str, str] = {}
+    for name, value in pragmas.items():
+        if query.exec(f"PRAGMA {name}") and query.next():
+            previous[name] = str(query.value(0))
+        query.exec(f"PRAGMA {name}={value}")
+    return previous
+
+
 def _ensure_base_tables(db: QSqlDatabase) -> None:
     query = QSqlQuery(db)
     query.exec(
@@ -44,13 +115,35 @@ def _ensure_base_tables(db: QSqlDatabase) -> None:
         )
         """
     )
+    _ensure_derived_columns(db, get_table_columns(db, "exams"))
+
+
+def _ensure_derived_columns(db: QSqlDatabase, columns: Iterable[str]) -> None:
+    """Add and index the derived column of every standard column present, plus the period index."""
+    standard = find_standard_columns(columns)
+    existing = set(get_generated_columns(db, "exams"))
+    query = QSqlQuery(db)
+    for field, (name, declared_type, expression) in DERIVED_COLUMNS.items():
+        col = standard.get(field)
+        if not col:
+            continue
+        if name not in existing:
+            query.exec(
+                f'ALTER TABLE exams ADD COLUMN "{name}" {declared_type} '
+                f"GENERATED ALWAYS AS ({expression.format(col=col)}) VIRTUAL"
+            )
+        if field not in ("year", "month"):
+            query.exec(f'CREATE INDEX IF NOT EXISTS "idx_exams_{name}" ON exams("{name}")')
+    if standard.get("year") and standard.get("month"):
+        query.exec('CREATE INDEX IF NOT EXISTS "idx_exams_year_i_month_i" ON exams("year_i", "month_i")')
 
 
+@functools.lru_cache(maxsize=1024)
 def sanitize_column(name: str) -> str:
     cleaned = name.strip().lower()
-    cleaned = cleaned.replace("á", "a").replace("é", "e").replace("í", "i").replace("ó", "o").replace("ú", "u")
-    cleaned = re.sub(r"[^\w]+", "_", cleaned)
-    cleaned = re.sub(r"_+", "_", cleaned).strip("_")
+    cleaned = cleaned.translate(_ACCENT_TABLE)
+    cleaned = _NON_WORD.sub("_", cleaned)
+    cleaned = _MULTI_UNDERSCORE.sub("_", cleaned).strip("_")
     if not cleaned:
         cleaned = "col"
     if cleaned[0].isdigit():
@@ -59,17 +152,29 @@ def sanitize_column(name: str) -> str:
 
 
 def ensure_columns(db: QSqlDatabase, columns: Iterable[str]) -> List[str]:
-    existing = get_table_columns(db, "exams")
+    existing = _exams_columns.get(db.databaseName())
+    if existing is None:
+        existing = get_table_columns(db, "exams")
+        _exams_columns[db.databaseName()] = existing
+    known = set(existing)
     to_add = []
     for col in columns:
-        if col not in existing and col != "id":
+        if col not in known and col != "id":
             to_add.append(col)
+            known.add(col)
     if not to_add:
         return existing
     query = QSqlQuery(db)
+    use_tx = db.transaction()
     for col in to_add:
         query.exec(f'ALTER TABLE exams ADD COLUMN "{col}" TEXT')
-    return get_table_columns(db, "exams")
+    if use_tx:
+        if not db.commit():
+            db.rollback()
+    columns = get_table_columns(db, "exams")
+    _exams_columns[db.databaseName()] = columns
+    _ensure_derived_columns(db, columns)
+    return columns
 
 
 def get_table_columns(db: QSqlDatabase, table: str) -> List[str]:
@@ -81,9 +186,30 @@ def get_table_columns(db: QSqlDatabase, table: str) -> List[str]:
     return cols
 
 
+def get_generated_columns(db: QSqlDatabase, table: str) -> List[str]:
+    # table_info leaves generated columns out; table_xinfo marks them hidden 2 (virtual) or 3 (stored).
+    query = QSqlQuery(db)
+    query.exec(f'PRAGMA table_xinfo("{table}")')
+    cols: List[str] = []
+    while query.next():
+        if query.value(6) in (2, 3):
+            cols.append(query.value(1))
+    return cols
+
+
 def find_standard_columns(columns: Iterable[str]) -> Dict[str, Optional[str]]:
-    col_list = list(columns)
-    candidates = {c.lower(): c for c in col_list}
+    key = tuple(columns)
+    cached = _standard_columns_cache.get(key)
+    if cached is None:
+        cached = _match_standard_columns(key)
+        _standard_columns_cache[key] = cached
+    return dict(cached)
+
+
+def _match_standard_columns(columns: Tuple[str, ...]) -> Dict[str, Optional[str]]:
+    candidates = {c.lower(): c for c in columns}
+    if _PATTERN_AUTOMATON is not None:
+        return _match_with_automaton(candidates)
 
     def pick(patterns: Iterable[str]) -> Optional[str]:
         for pat in patterns:
@@ -92,32 +218,47 @@ def find_standard_columns(columns: Iterable[str]) -> Dict[str, Optional[str]]:
                     return original
         return None
 
-    return {
-        "month": pick(["mes", "month"]),
-        "year": pick(["anyo", "anio", "año", "year"]),
-        "province": pick(["desc_provincia", "prov", "provincia"]),
-        "exam_center": pick(["centro_examen", "exam_center", "centro"]),
-        "exam_type": pick(["tipo_examen", "exam_type", "prueba", "tipo"]),
-        "driving_school": pick(["nombre_autoescuela", "autoescuela", "driving_school", "escuela"]),
-        "permit": pick(["nombre_permiso", "permiso"]),
-        "num_aptos": pick(["num_aptos"]),
-        "num_no_aptos": pick(["num_no_aptos"]),
-    }
+    return {name: pick(patterns) for name, patterns in _STANDARD_PATTERNS.items()}
+
+
+def _match_with_automaton(candidates: Dict[str, str]) -> Dict[str, Optional[str]]:
+    # Same result as pick(): the earliest pattern wins, then the earliest header.
+    best: Dict[str, Tuple[int, int, str]] = {}
+    for position, (key, original) in enumerate(candidates.items()):
+        for _, targets in _PATTERN_AUTOMATON.iter(key):
+            for name, priority in targets:
+                current = best.get(name)
+                if current is None or (priority, position) < current[:2]:
+                    best[name] = (priority, position, original)
+    return {name: best[name][2] if name in best else None for name in _STANDARD_PATTERNS}
 
 
-def imported_period_exists(db: QSqlDatabase, year: int, month: int) -> bool:
+def load_imported_periods(db: QSqlDatabase) -> set[Tuple[int, int]]:
     query = QSqlQuery(db)
-    query.prepare("SELECT 1 FROM imported_periods WHERE year = ? AND month = ?")
-    query.addBindValue(year)
-    query.addBindValue(month)
-    query.exec()
-    return query.next()
+    query.exec("SELECT year, month FROM imported_periods")
+    periods: set[Tuple[int, int]] = set()
+    while query.next():
+        year = query.value(0)
+        month = query.value(1)
+        if year is None or month is None:
+            continue
+        try:
+            periods.add((int(year), int(month)))
+        except (TypeError, ValueError):
+            continue
+    return periods
 
 
 def register_imported_periods(db: QSqlDatabase, periods: Iterable[Tuple[int, int]]) -> None:
+    years: List[int] = []
+    months: List[int] = []
+    for year, month in periods:
+        years.append(year)
+        months.append(month)
+    if not years:
+        return
     query = QSqlQuery(db)
     query.prepare("INSERT OR IGNORE INTO imported_periods (year, month) VALUES (?, ?)")
-    for year, month in periods:
-        query.addBindValue(year)
-        query.addBindValue(month)
-        query.exec()
+    query.addBindValue(years)
+    query.addBindValue(months)
+    query.execBatch(QSqlQuery.BatchExecutionMode.ValuesAsRows)
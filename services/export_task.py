@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import itertools
+import os
+import tempfile
+from typing import Dict, Iterator, List, Optional
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+from PyQt6.QtSql import QSqlDatabase, QSqlQuery
+
+from services.database import CONNECTION_PRAGMAS, apply_pragmas
+from services.reports import LARGE_TABLE_ROWS, export_html_to_pdf, export_table_to_pdf, render_table_to_html
+
+PROGRESS_ROWS = 5000
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportSignals(QObject):
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+
+class TableExportTask(QRunnable):
+    """Streams a query's rows on its own connection into a PDF, off the GUI thread.
+
+    The chart, if any, has to be grabbed on the GUI thread beforehand and passed in as base64.
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        sql: str,
+        params: List,
+        labels: Dict[Optional[str], str],
+        title: str,
+        output_path: str,
+        chart_base64: Optional[str] = None,
+    ) -> None:
+        super().__init__()
+        self.signals = ExportSignals()
+        self._database_path = database_path
+        self._sql = sql
+        self._params = params
+        self._labels = labels
+        self._title = title
+        self._output_path = output_path
+        self._chart_base64 = chart_base64
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    def run(self) -> None:
+        # An exception escaping QRunnable.run aborts the whole application, so every failure is reported instead.
+        connection_name = f"export_{id(self)}"
+        written = False
+        try:
+            written = self._run(connection_name)
+        except ExportCancelled:
+            pass
+        except Exception as exc:
+            self.signals.failed.emit(str(exc))
+        finally:
+            QSqlDatabase.removeDatabase(connection_name)
+        if written:
+            self.signals.finished.emit(self._output_path)
+
+    def _run(self, connection_name: str) -> bool:
+        # The handle and every query on it must be gone before run() removes the connection.
+        db = QSqlDatabase.addDatabase("QSQLITE", connection_name)
+        db.setDatabaseName(self._database_path)
+        db.setConnectOptions("QSQLITE_OPEN_READONLY;QSQLITE_BUSY_TIMEOUT=5000")
+        if not db.open():
+            self.signals.failed.emit(db.lastError().text())
+            return False
+        apply_pragmas(db, CONNECTION_PRAGMAS)
+        try:
+            return self._export(db)
+        finally:
+            db.close()
+
+    def _export(self, db: QSqlDatabase) -> bool:
+        query = QSqlQuery(db)
+        query.setForwardOnly(True)
+        query.prepare(self._sql)
+        for param in self._params:
+            query.addBindValue(param)
+        if not query.exec():
+            self.signals.failed.emit(query.lastError().text())
+            return False
+        record = query.record()
+        columns = [record.fieldName(i) for i in range(record.count())]
+        headers = [self._labels.get(column, column) for column in columns]
+        rows = self._iter_rows(query, len(columns))
+        # Rows stream into the PDF, so it is written next to the target and only moved there once complete;
+        # a cancelled or failed export leaves the user's path untouched.
+        fd, temp_path = tempfile.mkstemp(suffix=".pdf", dir=os.path.dirname(os.path.abspath(self._output_path)))
+        os.close(fd)
+        try:
+            # Only the first rows are held, to choose the renderer; the rest go straight to the PDF.
+            head = list(itertools.islice(rows, LARGE_TABLE_ROWS + 1))
+            if self._chart_base64 is None and len(head) > LARGE_TABLE_ROWS:
+                export_table_to_pdf(headers, itertools.chain(head, rows), self._title, temp_path)
+            else:
+                html = render_table_to_html(
+                    headers, itertools.chain(head, rows), self._title, chart_base64=self._chart_base64
+                )
+                export_html_to_pdf(html, temp_path)
+            os.replace(temp_path, self._output_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return True
+
+    def _iter_rows(self, query: QSqlQuery, column_count: int) -> Iterator[List[str]]:
+        indexes = range(column_count)
+        count = 0
+        while query.next():
+            if self._cancelled:
+                raise ExportCancelled()
+            yield [str(query.value(i)) for i in indexes]
+            count += 1
+            if count % PROGRESS_ROWS == 0:
+                self.signals.progress.emit(count)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import sys
+from typing import Iterable, Optional, Tuple
+
+import numba
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pa_compute
+
+INVALID_PERIOD = -(2**63)
+# Twelve months over two centuries: wide enough for any real export.
+_MAX_PERIOD_SPAN = 12 * 200
+# A frozen build has no writable __pycache__ beside its sources, and numba refuses to cache without one.
+_CACHE_JIT = not getattr(sys, "frozen", False)
+
+
+@numba.njit(cache=_CACHE_JIT)
+def distinct_period_codes(codes):
+    if codes.shape[0] == 0:
+        return codes
+    lo = codes.min()
+    hi = codes.max()
+    if hi - lo >= _MAX_PERIOD_SPAN:
+        return np.unique(codes)
+    seen = np.zeros(hi - lo + 1, np.bool_)
+    for i in range(codes.shape[0]):
+        seen[codes[i] - lo] = True
+    return np.flatnonzero(seen) + lo
+
+
+def period_codes(years: pa.ChunkedArray, months: pa.ChunkedArray) -> Optional[np.ndarray]:
+    """Encode each row's period as year * 12 + month - 1, or None if a column is not numeric."""
+    numbers = []
+    try:
+        for column in (years, months):
+            trimmed = pa_compute.utf8_trim_whitespace(column)
+            blank = pa_compute.equal(trimmed, "")
+            numbers.append(pa_compute.cast(pa_compute.if_else(blank, pa.scalar(None, pa.string()), trimmed), pa.int64()))
+    except pa.ArrowInvalid:
+        return None
+    valid = pa_compute.and_(pa_compute.is_valid(numbers[0]), pa_compute.is_valid(numbers[1]))
+    year_arr = pa_compute.fill_null(numbers[0], 0).to_numpy()
+    month_arr = pa_compute.fill_null(numbers[1], 0).to_numpy()
+    valid_arr = valid.to_numpy(zero_copy_only=False) & (month_arr >= 1) & (month_arr <= 12)
+    return np.where(valid_arr, year_arr * 12 + month_arr - 1, INVALID_PERIOD)
+
+
+def rows_outside(codes: np.ndarray, periods: Iterable[Tuple[int, int]]) -> np.ndarray:
+    """Mask of the rows whose period is not one of the given (year, month) pairs."""
+    return ~np.isin(codes, [year * 12 + month - 1 for year, month in periods])
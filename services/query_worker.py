@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from PyQt6.QtSql import QSqlDatabase, QSqlQuery
+
+from services.database import CONNECTION_PRAGMAS, apply_pragmas
+
+PREPARED_CACHE_SIZE = 32
+
+
+class QueryWorker(QObject):
+    """Runs read-only queries on its own SQLite connection, inside the thread it is moved to."""
+
+    resultReady = pyqtSignal(int, list, list)
+    chunkReady = pyqtSignal(int, list, list, bool)
+    queryFailed = pyqtSignal(int, str)
+
+    def __init__(self, database_path: str, connection_name: str = "query_worker") -> None:
+        super().__init__()
+        self._database_path = database_path
+        self._connection_name = connection_name
+        self._db: Optional[QSqlDatabase] = None
+        self._cancelled_id = 0
+        self._cancelled_ids: set[int] = set()
+        # Only one cursor is kept open so an idle read never holds SQLite's lock for long.
+        self._cursor: Optional[Tuple[int, QSqlQuery, List[str]]] = None
+        # Prepared statements by SQL text; paging and re-sorting repeat the same few shapes.
+        self._prepared: OrderedDict[str, QSqlQuery] = OrderedDict()
+
+    # The cancel methods are called from the GUI thread; the flags they set are checked between rows.
+    def cancel(self, request_id: int) -> None:
+        self._cancelled_ids.add(request_id)
+
+    def cancel_up_to(self, request_id: int) -> None:
+        self._cancelled_id = request_id
+
+    def _is_cancelled(self, request_id: int) -> bool:
+        return request_id <= self._cancelled_id or request_id in self._cancelled_ids
+
+    def _database(self) -> QSqlDatabase:
+        if self._db is None:
+            db = QSqlDatabase.addDatabase("QSQLITE", self._connection_name)
+            db.setDatabaseName(self._database_path)
+            db.setConnectOptions("QSQLITE_OPEN_READONLY;QSQLITE_BUSY_TIMEOUT=5000")
+            if db.open():
+                apply_pragmas(db, CONNECTION_PRAGMAS)
+            self._db = db
+        return self._db
+
+    @pyqtSlot(int, str, list)
+    def run_query(self, request_id: int, sql: str, params: List) -> None:
+        try:
+            self._run_query(request_id, sql, params)
+        finally:
+            self._cancelled_ids.discard(request_id)
+
+    def _run_query(self, request_id: int, sql: str, params: List) -> None:
+        if self._is_cancelled(request_id):
+            return
+        query = self._exec(request_id, sql, params)
+        if query is None:
+            return
+        columns = self._field_names(query)
+        indexes = range(len(columns))
+        rows = []
+        try:
+            while query.next():
+                if self._is_cancelled(request_id):
+                    return
+                rows.append(tuple(query.value(i) for i in indexes))
+        finally:
+            query.finish()
+        self.resultReady.emit(request_id, columns, rows)
+
+    @pyqtSlot(int, str, list, int)
+    def open_cursor(self, request_id: int, sql: str, params: List, count: int) -> None:
+        """Run a query and send its first rows; the rest are sent as fetch_more asks for them."""
+        self.release_cursor()
+        if self._is_cancelled(request_id):
+            self._cancelled_ids.discard(request_id)
+            return
+        query = self._exec(request_id, sql, params)
+        if query is None:
+            return
+        self._cursor = (request_id, query, self._field_names(query))
+        self._send_chunk(count)
+
+    @pyqtSlot(int, int)
+    def fetch_more(self, request_id: int, count: int) -> None:
+        if self._cursor is None or self._cursor[0] != request_id:
+            return
+        self._send_chunk(count)
+
+    @pyqtSlot()
+    def release_cursor(self) -> None:
+        if self._cursor is None:
+            return
+        request_id, query, _ = self._cursor
+        self._cursor = None
+        query.finish()
+        self._cancelled_ids.discard(request_id)
+
+    def _send_chunk(self, count: int) -> None:
+        request_id, query, columns = self._cursor
+        if self._is_cancelled(request_id):
+            self.release_cursor()
+            return
+        indexes = range(len(columns))
+        rows = []
+        while len(rows) < count and query.next():
+            rows.append(tuple(query.value(i) for i in indexes))
+        exhausted = len(rows) < count
+        if exhausted:
+            self.release_cursor()
+        self.chunkReady.emit(request_id, columns, rows, exhausted)
+
+    def _exec(self, request_id: int, sql: str, params: List) -> Optional[QSqlQuery]:
+        query = self._prepare(sql)
+        for index, param in enumerate(params):
+            query.bindValue(index, param)
+        if not query.exec():
+            self.queryFailed.emit(request_id, query.lastError().text())
+            query.finish()
+            return None
+        return query
+
+    def _prepare(self, sql: str) -> QSqlQuery:
+        query = self._prepared.get(sql)
+        # The open cursor is still being read, so the same SQL needs a statement of its own meanwhile.
+        if query is not None and (self._cursor is None or self._cursor[1] is not query):
+            self._prepared.move_to_end(sql)
+            return query
+        query = QSqlQuery(self._database())
+        query.setForwardOnly(True)
+        if not query.prepare(sql):
+            # exec() reports the error.
+            return query
+        self._prepared[sql] = query
+        if len(self._prepared) > PREPARED_CACHE_SIZE:
+            self._prepared.popitem(last=False)
+        return query
+
+    @staticmethod
+    def _field_names(query: QSqlQuery) -> List[str]:
+        record = query.record()
+        return [record.fieldName(i) for i in range(record.count())]
+
+    @pyqtSlot()
+    def close(self) -> None:
+        self.release_cursor()
+        self._prepared.clear()
+        if self._db is None:
+            return
+        self._db.close()
+        self._db = None
+        QSqlDatabase.removeDatabase(self._connection_name)
@@ -1,24 +1,31 @@
 from __future__ import annotations
 
-from typing import List, Optional
+import io
+from html import escape
+from typing import Iterable, List, Optional
 
-from PyQt6.QtCore import Qt, QMarginsF
-from PyQt6.QtGui import QPageLayout, QTextDocument
+from PyQt6.QtCore import Qt, QMarginsF, QRect, QRectF
+from PyQt6.QtGui import QColor, QFont, QPageLayout, QPageSize, QPainter, QPdfWriter, QTextDocument
 from PyQt6.QtPrintSupport import QPrinter
 
+# Above this many rows QTextDocument's table layout gets too slow, so the table is painted directly.
+LARGE_TABLE_ROWS = 10000
+
 
 def render_table_to_html(
     headers: List[str],
-    rows: List[List[str]],
+    rows: Iterable[List[str]],
     title: str,
     chart_base64: Optional[str] = None,
 ) -> str:
-    header_html = "".join([f"<th>{h}</th>" for h in headers])
-    body_rows = []
+    header_html = "".join(f"<th>{escape(str(h))}</th>" for h in headers)
+    # Rows may be a generator; each one is written as it arrives so none has to be kept.
+    body = io.StringIO()
     for row in rows:
-        cells = "".join([f"<td>{c}</td>" for c in row])
-        body_rows.append(f"<tr>{cells}</tr>")
-    body_html = "".join(body_rows)
+        body.write("<tr><td>")
+        body.write("</td><td>".join(escape(str(cell)) for cell in row))
+        body.write("</td></tr>")
+    body_html = body.getvalue()
     chart_html = f'<img src="data:image/png;base64,{chart_base64}" style="width: 100%; margin-top: 16px;" />' if chart_base64 else ""
     return f"""
     <html>
@@ -50,5 +57,73 @@ def export_html_to_pdf(html: str, output_path: str) -> None:
     printer.setPageMargins(QMarginsF(12, 12, 12, 12), QPageLayout.Unit.Millimeter)
 
     doc = QTextDocument()
+    doc.setUndoRedoEnabled(False)
+    doc.setUseDesignMetrics(True)
     doc.setHtml(html)
     doc.print(printer)
+
+
+def export_table_to_pdf(headers: List[str], rows: Iterable[List[str]], title: str, output_path: str) -> None:
+    writer = QPdfWriter(output_path)
+    writer.setPageSize(QPageSize(QPageSize.PageSizeId.A4))
+    writer.setPageMargins(QMarginsF(12, 12, 12, 12), QPageLayout.Unit.Millimeter)
+
+    painter = QPainter(writer)
+    try:
+        body_font = QFont("Arial", 10)
+        header_font = QFont(body_font)
+        header_font.setBold(True)
+        title_font = QFont("Arial", 14)
+        title_font.setBold(True)
+
+        painter.setPen(QColor("#333"))
+        painter.setFont(body_font)
+        padding = painter.fontMetrics().height() / 4
+        line_height = painter.fontMetrics().height() + 2 * padding
+        page_width = writer.width()
+        page_height = writer.height()
+        col_width = page_width / max(len(headers), 1)
+        text_width = max(int(col_width - 2 * padding), 1)
+        align = Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter
+        wrap = int(align | Qt.TextFlag.TextWordWrap | Qt.TextFlag.TextWrapAnywhere)
+
+        def measure_row(values: List[str], font: QFont) -> float:
+            # Long values wrap onto extra lines instead of being cut, so the row grows to its tallest cell.
+            painter.setFont(font)
+            metrics = painter.fontMetrics()
+            text_height = max(
+                (metrics.boundingRect(QRect(0, 0, text_width, page_height), wrap, value).height() for value in values),
+                default=0,
+            )
+            return min(max(line_height, text_height + 2 * padding), page_height)
+
+        def draw_row(y: float, values: List[str], height: float, is_header: bool) -> None:
+            painter.setFont(header_font if is_header else body_font)
+            for i, value in enumerate(values):
+                rect = QRectF(i * col_width, y, col_width, height)
+                if is_header:
+                    painter.fillRect(rect, QColor("#efefef"))
+                painter.drawRect(rect)
+                painter.drawText(rect.adjusted(padding, padding, -padding, -padding), wrap, value)
+
+        painter.setFont(title_font)
+        title_height = painter.fontMetrics().height() * 2
+        painter.drawText(QRectF(0, 0, page_width, title_height), align, title)
+
+        header_values = [str(value) for value in headers]
+        header_height = measure_row(header_values, header_font)
+        y = title_height
+        draw_row(y, header_values, header_height, True)
+        y += header_height
+        for row in rows:
+            values = [str(value) for value in row]
+            row_height = measure_row(values, body_font)
+            if y + row_height > page_height:
+                writer.newPage()
+                y = 0
+                draw_row(y, header_values, header_height, True)
+                y += header_height
+            draw_row(y, values, row_height, False)
+            y += row_height
+    finally:
+        painter.end()
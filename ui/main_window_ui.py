@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import base64
-from typing import List, Optional, Tuple
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from PyQt6.QtCore import Qt
-from PyQt6.QtCore import QByteArray, QBuffer
+from PyQt6.QtCore import QByteArray, QBuffer, QMetaObject, QThread, QStringListModel, QThreadPool, QTimer, pyqtSignal
 from PyQt6.QtGui import QAction, QImage
-from PyQt6.QtSql import QSqlDatabase, QSqlQuery, QSqlQueryModel
+from PyQt6.QtSql import QSqlDatabase
 from PyQt6.QtWidgets import (
     QCheckBox,
     QComboBox,
@@ -20,6 +23,7 @@ from PyQt6.QtWidgets import (
     QMainWindow,
     QMenu,
     QMessageBox,
+    QProgressDialog,
     QPushButton,
     QSpinBox,
     QTabWidget,
@@ -27,35 +31,203 @@ from PyQt6.QtWidgets import (
     QToolButton,
     QVBoxLayout,
     QWidget,
-    QApplication,
 )
 
 from services.charts import build_bar_chart
 from services.csv_importer import import_csv
 from services.database import (
+    DERIVED_COLUMNS,
     find_standard_columns,
     get_table_columns,
     open_database,
 )
+from services.export_task import TableExportTask
+from services.query_worker import QueryWorker
 from services.reports import export_html_to_pdf, render_table_to_html
+from ui.result_table_model import FETCH_CHUNK, ResultTableModel
+
+# Called with (columns, rows); a streamed query also passes a fetch function, or None once every row is in.
+QueryCallback = Callable[..., None]
+# (slot, callback, cache key) of a query the worker has not answered yet.
+PendingQuery = Tuple[str, QueryCallback, Optional[bytes]]
+
+QUERY_CACHE_SIZE = 32
+COMPLETER_DEBOUNCE_MS = 150
+COMPLETION_LIMIT = 50
+CHART_PNG_QUALITY = 80
+# Completions for these fields are narrowed by what is already typed in the fields they depend on.
+COMPLETER_DEPENDENCIES = {
+    "exam_center": ("province",),
+    "driving_school": ("province", "exam_center"),
+}
+
+
+def _sql_sort_key(value: Any) -> Tuple[int, Any]:
+    # SQLite orders NULLs first, then numbers, then text.
+    if value is None:
+        return 0, 0
+    if isinstance(value, (int, float)):
+        return 1, value
+    return 2, str(value)
 
 
 class MainWindow(QMainWindow):
+    queryRequested = pyqtSignal(int, str, list)
+    cursorRequested = pyqtSignal(int, str, list, int)
+    fetchRequested = pyqtSignal(int, int)
+    cursorReleaseRequested = pyqtSignal()
+
     def __init__(self) -> None:
         super().__init__()
         self.setWindowTitle("DGT Driving Exams")
         self.resize(1200, 720)
 
         self.db: QSqlDatabase = open_database()
-        self.model = QSqlQueryModel(self)
+        self.model = ResultTableModel(self)
         self.current_columns: List[str] = []
         self.current_headers: List[str] = []
-        self.standard_columns = find_standard_columns(get_table_columns(self.db, "exams"))
+        self._load_standard_columns()
+        self.page_size = 500
+        self.page_index = 0
+        self.total_rows = 0
+        self._order_by: Optional[str] = None
+        self._order_dir = "ASC"
+        self._next_request_id = 0
+        self._pending_queries: Dict[int, PendingQuery] = {}
+        self._latest_requests: Dict[str, int] = {}
+        self._query_cache: OrderedDict[bytes, Tuple[List[str], List[tuple]]] = OrderedDict()
+        self._stream: Optional[Tuple[int, Optional[bytes]]] = None
+        self._group_rows: List[tuple] = []
+        self._result_query: Tuple[str, List] = ("", [])
+        self._export_task: Optional[TableExportTask] = None
+        self._distinct_cache: Dict[Tuple[str, Tuple[Tuple[Optional[str], str], ...], str], List[str]] = {}
+        self._row_count_ready = False
+        self._row_count_exact = True
+        self._start_query_worker()
 
         self._build_menu()
         self._build_ui()
         self._refresh_completers()
-        self._apply_filters()
+        # The default filters span the stored years, so they are applied once that range is known.
+        self._refresh_year_month_ranges(on_ready=self._apply_filters)
+
+    def _start_query_worker(self) -> None:
+        self.query_thread = QThread(self)
+        self.query_worker = QueryWorker(self.db.databaseName())
+        self.query_worker.moveToThread(self.query_thread)
+        self.queryRequested.connect(self.query_worker.run_query)
+        self.cursorRequested.connect(self.query_worker.open_cursor)
+        self.fetchRequested.connect(self.query_worker.fetch_more)
+        self.cursorReleaseRequested.connect(self.query_worker.release_cursor)
+        self.query_worker.resultReady.connect(self._on_query_result)
+        self.query_worker.chunkReady.connect(self._on_query_chunk)
+        self.query_worker.queryFailed.connect(self._on_query_failed)
+        # The worker's connection belongs to its thread, so it is closed from there.
+        self.query_thread.finished.connect(self.query_worker.close, Qt.ConnectionType.DirectConnection)
+        self.query_thread.start()
+
+    def closeEvent(self, event) -> None:
+        self.query_worker.cancel_up_to(self._next_request_id)
+        self.query_thread.quit()
+        self.query_thread.wait()
+        if self._export_task is not None:
+            self._export_task.cancel()
+            QThreadPool.globalInstance().waitForDone()
+        super().closeEvent(event)
+
+    def _submit_query(
+        self,
+        slot: str,
+        sql: str,
+        params: List,
+        callback: QueryCallback,
+        cache: bool = False,
+        stream: bool = False,
+    ) -> None:
+        """Run a query on the worker thread; a newer query for the same slot replaces an older one.
+
+        With cache=True the result is remembered by SQL and parameters, and a repeat is answered
+        without touching the database until the next import.
+
+        With stream=True the callback gets the first chunk of rows and a fetch function for the
+        table model, and the rest go to the model as it fetches them. Only one query streams at a time.
+        """
+        self._next_request_id += 1
+        request_id = self._next_request_id
+        previous = self._latest_requests.get(slot)
+        if previous in self._pending_queries:
+            self.query_worker.cancel(previous)
+            del self._pending_queries[previous]
+        self._latest_requests[slot] = request_id
+        if stream:
+            self._release_stream()
+
+        cache_key = hashlib.blake2b((sql + repr(params)).encode()).digest() if cache else None
+        if cache_key is not None and cache_key in self._query_cache:
+            self._query_cache.move_to_end(cache_key)
+            self.cancel_button.setEnabled(bool(self._pending_queries))
+            callback(*self._query_cache[cache_key])
+            return
+
+        self._pending_queries[request_id] = (slot, callback, cache_key)
+        self.cancel_button.setEnabled(True)
+        if stream:
+            self.cursorRequested.emit(request_id, sql, params, FETCH_CHUNK)
+        else:
+            self.queryRequested.emit(request_id, sql, params)
+
+    def _on_query_result(self, request_id: int, columns: List[str], rows: List[tuple]) -> None:
+        entry = self._pending_queries.pop(request_id, None)
+        self.cancel_button.setEnabled(bool(self._pending_queries))
+        if entry is None:
+            return
+        _, callback, cache_key = entry
+        if cache_key is not None:
+            self._remember(cache_key, columns, rows)
+        callback(columns, rows)
+
+    def _on_query_chunk(self, request_id: int, columns: List[str], rows: List[tuple], exhausted: bool) -> None:
+        entry = self._pending_queries.pop(request_id, None)
+        if entry is not None:
+            self.cancel_button.setEnabled(bool(self._pending_queries))
+            _, callback, cache_key = entry
+            self._stream = (request_id, cache_key)
+            fetch = None if exhausted else lambda count: self.fetchRequested.emit(request_id, count)
+            callback(columns, rows, fetch)
+            if self._stream is None or self._stream[0] != request_id:
+                return
+        elif self._stream is not None and self._stream[0] == request_id:
+            self.model.append_rows(rows, exhausted)
+        else:
+            return
+        if exhausted:
+            cache_key = self._stream[1]
+            self._stream = None
+            if cache_key is not None:
+                self._remember(cache_key, columns, list(self.model.rows()))
+
+    def _remember(self, cache_key: bytes, columns: List[str], rows: List[tuple]) -> None:
+        self._query_cache[cache_key] = (columns, rows)
+        if len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+
+    def _release_stream(self) -> None:
+        if self._stream is not None:
+            self._stream = None
+            self.cursorReleaseRequested.emit()
+
+    def _on_query_failed(self, request_id: int, message: str) -> None:
+        entry = self._pending_queries.pop(request_id, None)
+        self.cancel_button.setEnabled(bool(self._pending_queries))
+        if entry is not None:
+            # One apply runs several queries, so failures go to the status bar rather than stacking dialogs.
+            self.statusBar().showMessage(f"Query for {entry[0]} failed: {message}")
+
+    def _cancel_queries(self) -> None:
+        self.query_worker.cancel_up_to(self._next_request_id)
+        self._pending_queries.clear()
+        self._release_stream()
+        self.cancel_button.setEnabled(False)
 
     def _build_menu(self) -> None:
         file_menu = self.menuBar().addMenu("File")
@@ -80,7 +252,7 @@ class MainWindow(QMainWindow):
 
         self.from_month = QComboBox()
         self.to_month = QComboBox()
-        months = ["", "1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "11", "12"]
+        months = [""] + [str(month) for month in range(1, 13)]
         self.from_month.addItems(months)
         self.to_month.addItems(months)
 
@@ -99,6 +271,15 @@ class MainWindow(QMainWindow):
         self.driving_school_input = QLineEdit()
         self.permit_input = QLineEdit()
 
+        self._completer_inputs = {
+            "province": self.province_input,
+            "exam_center": self.exam_center_input,
+            "driving_school": self.driving_school_input,
+            "permit": self.permit_input,
+        }
+        for field, line_edit in self._completer_inputs.items():
+            self._attach_completer(field, line_edit)
+
         self.exam_type_input = QComboBox()
         self.exam_type_input.addItem("")
 
@@ -146,7 +327,11 @@ class MainWindow(QMainWindow):
         actions_layout = QHBoxLayout()
         self.apply_button = QPushButton("Apply filters")
         self.apply_button.clicked.connect(self._apply_filters)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self._cancel_queries)
         actions_layout.addStretch(1)
+        actions_layout.addWidget(self.cancel_button)
         actions_layout.addWidget(self.apply_button)
         layout.addLayout(actions_layout)
 
@@ -187,6 +372,7 @@ class MainWindow(QMainWindow):
         self.table_view.setModel(self.model)
         self.table_view.setSortingEnabled(True)
         self.table_view.horizontalHeader().sortIndicatorChanged.connect(self._on_sort_changed)
+        self.table_view.verticalScrollBar().valueChanged.connect(self._on_table_scrolled)
 
         self.chart_container = QWidget()
         self.chart_layout = QVBoxLayout(self.chart_container)
@@ -198,6 +384,14 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.tabs)
 
         export_layout = QHBoxLayout()
+        self.prev_page_button = QPushButton("Previous")
+        self.prev_page_button.clicked.connect(self._previous_page)
+        self.next_page_button = QPushButton("Next")
+        self.next_page_button.clicked.connect(self._next_page)
+        self.page_label = QLabel()
+        export_layout.addWidget(self.prev_page_button)
+        export_layout.addWidget(self.page_label)
+        export_layout.addWidget(self.next_page_button)
         export_layout.addStretch(1)
         self.export_button = QToolButton()
         self.export_button.setText("Export PDF")
@@ -222,7 +416,23 @@ class MainWindow(QMainWindow):
         )
         if not path:
             return
-        inserted, periods = import_csv(self.db, path)
+        # An open worker cursor would keep the import from taking its write lock.
+        self._cancel_queries()
+        QMetaObject.invokeMethod(self.query_worker, "release_cursor", Qt.ConnectionType.BlockingQueuedConnection)
+        try:
+            inserted, periods = import_csv(self.db, path)
+        except Exception as exc:
+            QMessageBox.warning(self, "CSV import", f"Import failed: {exc}")
+        else:
+            self._report_import(inserted, periods)
+        self._query_cache.clear()
+        self._distinct_cache.clear()
+        self._load_standard_columns()
+        self._refresh_completers()
+        # The default filters span the stored years, so they are applied once that range is known.
+        self._refresh_year_month_ranges(on_ready=self._apply_filters)
+
+    def _report_import(self, inserted: int, periods: List[Tuple[int, int]]) -> None:
         if inserted == 0 and periods:
             QMessageBox.information(
                 self,
@@ -231,86 +441,163 @@ class MainWindow(QMainWindow):
             )
         else:
             QMessageBox.information(self, "CSV import", f"Imported {inserted} rows.")
-        self.standard_columns = find_standard_columns(get_table_columns(self.db, "exams"))
-        self._refresh_completers()
-        self._apply_filters()
 
     def _refresh_completers(self) -> None:
-        province_values = self._distinct_values(self.standard_columns.get("province"))
-        exam_center_values = self._distinct_values(self.standard_columns.get("exam_center"))
-        driving_school_values = self._distinct_values(self.standard_columns.get("driving_school"))
-        exam_type_values = self._distinct_values(self.standard_columns.get("exam_type"))
-        permit_values = self._distinct_values(self.standard_columns.get("permit"))
-
-        self._set_completer(self.province_input, province_values)
-        self._set_completer(self.exam_center_input, exam_center_values)
-        self._set_completer(self.driving_school_input, driving_school_values)
-        self._set_completer(self.permit_input, permit_values)
+        self._request_distinct_values("exam_type", self._derived_column("exam_type"), [], self._set_exam_types)
 
+    def _set_exam_types(self, values: List[str]) -> None:
         self.exam_type_input.clear()
         self.exam_type_input.addItem("")
-        self.exam_type_input.addItems(exam_type_values)
-
-        self.province_input.editingFinished.connect(self._refresh_exam_center_completer)
-        self.exam_center_input.editingFinished.connect(self._refresh_driving_school_completer)
-        self._refresh_year_month_ranges()
+        self.exam_type_input.addItems(values)
 
-    def _refresh_exam_center_completer(self) -> None:
-        province = self.province_input.text().strip()
-        values = self._distinct_values(
-            self.standard_columns.get("exam_center"),
-            filters=[(self.standard_columns.get("province"), province)] if province else [],
-        )
-        self._set_completer(self.exam_center_input, values)
-
-    def _refresh_driving_school_completer(self) -> None:
-        province = self.province_input.text().strip()
-        exam_center = self.exam_center_input.text().strip()
-        filters = []
-        if province:
-            filters.append((self.standard_columns.get("province"), province))
-        if exam_center:
-            filters.append((self.standard_columns.get("exam_center"), exam_center))
-        values = self._distinct_values(self.standard_columns.get("driving_school"), filters=filters)
-        self._set_completer(self.driving_school_input, values)
-
-    def _set_completer(self, line_edit: QLineEdit, values: List[str]) -> None:
-        completer = QCompleter(values)
+    def _attach_completer(self, field: str, line_edit: QLineEdit) -> None:
+        completer = QCompleter(QStringListModel(line_edit), line_edit)
         completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
         completer.setFilterMode(Qt.MatchFlag.MatchContains)
         line_edit.setCompleter(completer)
+        # Look the typed text up once typing settles, not on every keystroke.
+        timer = QTimer(line_edit)
+        timer.setSingleShot(True)
+        timer.setInterval(COMPLETER_DEBOUNCE_MS)
+        timer.timeout.connect(lambda: self._request_completions(field, line_edit))
+        line_edit.textEdited.connect(timer.start)
+
+    def _request_completions(self, field: str, line_edit: QLineEdit) -> None:
+        text = line_edit.text().strip()
+        completer = line_edit.completer()
+        if not text:
+            completer.model().setStringList([])
+            return
+        filters = [
+            (self._derived_column(dependency), self._completer_inputs[dependency].text())
+            for dependency in COMPLETER_DEPENDENCIES.get(field, ())
+        ]
 
-    def _distinct_values(self, column: Optional[str], filters: Optional[List[Tuple[Optional[str], str]]] = None) -> List[str]:
+        def show(values: List[str]) -> None:
+            completer.model().setStringList(values)
+            if line_edit.hasFocus() and line_edit.text().strip() == text:
+                completer.setCompletionPrefix(text)
+                completer.complete()
+
+        self._request_distinct_values(field, self._derived_column(field), filters, show, contains=text)
+
+    def _request_distinct_values(
+        self,
+        slot: str,
+        column: Optional[str],
+        filters: List[Tuple[Optional[str], str]],
+        on_values: Callable[[List[str]], None],
+        contains: str = "",
+    ) -> None:
+        """Distinct values of a derived column; with contains, only the first few holding that text."""
         if not column:
-            return []
-        filters = filters or []
+            on_values([])
+            return
+        cache_key = (column, tuple((col, value.strip()) for col, value in filters if col and value), contains)
+        cached = self._distinct_cache.get(cache_key)
+        if cached is not None:
+            on_values(cached)
+            return
         clauses = []
+        params = []
         for col, value in filters:
             if col and value:
-                clauses.append(f'TRIM("{col}") = ?')
+                clauses.append(f'"{col}" = ?')
+                params.append(value.strip())
+        limit_sql = ""
+        if contains:
+            clauses.append(f'"{column}" LIKE ? ESCAPE ?')
+            params.extend(["%" + re.sub(r"([%_\\])", r"\\\1", contains) + "%", "\\"])
+            limit_sql = f" LIMIT {COMPLETION_LIMIT}"
         where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-        query = QSqlQuery(self.db)
-        query.prepare(f'SELECT DISTINCT TRIM("{column}") FROM exams {where_sql} ORDER BY TRIM("{column}")')
+        sql = f'SELECT DISTINCT "{column}" FROM exams {where_sql} ORDER BY "{column}"{limit_sql}'
+
+        def collect(_columns: List[str], rows: List[tuple]) -> None:
+            values = [str(row[0]) for row in rows if row[0] is not None and str(row[0]).strip()]
+            self._distinct_cache[cache_key] = values
+            on_values(values)
+
+        self._submit_query(f"distinct:{slot}", sql, params, collect)
+
+    def _build_query(
+        self, order_by: Optional[str] = None, order_dir: str = "ASC", page: Optional[int] = None
+    ) -> Tuple[str, List]:
+        group = self.group_by.currentText()
+        select_columns = tuple(self._selected_columns()) if group == "None" else ()
+        params = []
+
+        month_col = self._derived_column("month")
+        year_col = self._derived_column("year")
+
+        from_month = self.from_month.currentText()
+        to_month = self.to_month.currentText()
+        from_year = self.from_year.value() if self.from_year.value() != 0 else None
+        to_year = self.to_year.value() if self.to_year.value() != 0 else None
+
+        has_from = bool(month_col and year_col and from_year and from_month)
+        if has_from:
+            params.extend([from_year, from_year, int(from_month)])
+        has_to = bool(month_col and year_col and to_year and to_month)
+        if has_to:
+            params.extend([to_year, to_year, int(to_month)])
+
+        filters = [
+            (self._derived_column("province"), self.province_input.text().strip()),
+            (self._derived_column("exam_center"), self.exam_center_input.text().strip()),
+            (self._derived_column("exam_type"), self.exam_type_input.currentText().strip()),
+            (self._derived_column("driving_school"), self.driving_school_input.text().strip()),
+            (self._derived_column("permit"), self.permit_input.text().strip()),
+        ]
+        filter_columns = []
         for col, value in filters:
             if col and value:
-                query.addBindValue(value.strip())
-        query.exec()
-        values = []
-        while query.next():
-            val = query.value(0)
-            if val is not None and str(val).strip():
-                values.append(str(val))
-        return values
-
-    def _build_query(self, order_by: Optional[str] = None, order_dir: str = "ASC") -> Tuple[str, List]:
-        select_columns = self._selected_columns()
-        group = self.group_by.currentText()
+                filter_columns.append(col)
+                params.append(value)
 
+        limit = self.limit_input.value()
+        if page is not None:
+            # The user limit caps the whole result, so the last page may be shorter.
+            offset = page * self.page_size
+            page_limit = self.page_size if limit <= 0 else max(min(self.page_size, limit - offset), 0)
+            params.extend([page_limit, offset])
+        elif limit > 0:
+            params.append(limit)
+
+        # Only the shape of the query decides its SQL text; the values are all bound.
+        shape = (
+            group,
+            select_columns,
+            has_from,
+            has_to,
+            tuple(filter_columns),
+            order_by,
+            order_dir,
+            page is not None,
+            limit > 0,
+        )
+        query = self._query_templates.get(shape)
+        if query is None:
+            query = self._compile_query(*shape)
+            self._query_templates[shape] = query
+        return query, params
+
+    def _compile_query(
+        self,
+        group: str,
+        select_columns: Tuple[str, ...],
+        has_from: bool,
+        has_to: bool,
+        filter_columns: Tuple[str, ...],
+        order_by: Optional[str],
+        order_dir: str,
+        paged: bool,
+        limited: bool,
+    ) -> str:
+        group_columns = self._group_columns(group)
         if group != "None":
-            group_columns = self._group_columns(group)
             metrics = []
-            aptos_col = self.standard_columns.get("num_aptos")
-            no_aptos_col = self.standard_columns.get("num_no_aptos")
+            aptos_col = self._col_aptos
+            no_aptos_col = self._col_no_aptos
             if aptos_col:
                 metrics.append(f'SUM(CAST("{aptos_col}" AS INTEGER)) as num_aptos')
             if no_aptos_col:
@@ -326,52 +613,31 @@ class MainWindow(QMainWindow):
             select_sql = ", ".join([f'"{c}"' for c in select_columns]) if select_columns else "*"
 
         where_clauses = []
-        params = []
-
-        month_col = self.standard_columns.get("month")
-        year_col = self.standard_columns.get("year")
-
-        from_month = self.from_month.currentText()
-        to_month = self.to_month.currentText()
-        from_year = self.from_year.value() if self.from_year.value() != 0 else None
-        to_year = self.to_year.value() if self.to_year.value() != 0 else None
-
-        if month_col and year_col and from_year and from_month:
-            where_clauses.append(
-                f'(CAST("{year_col}" AS INTEGER) > ? OR (CAST("{year_col}" AS INTEGER) = ? AND CAST("{month_col}" AS INTEGER) >= ?))'
-            )
-            params.extend([from_year, from_year, from_month])
-        if month_col and year_col and to_year and to_month:
-            where_clauses.append(
-                f'(CAST("{year_col}" AS INTEGER) < ? OR (CAST("{year_col}" AS INTEGER) = ? AND CAST("{month_col}" AS INTEGER) <= ?))'
-            )
-            params.extend([to_year, to_year, to_month])
-
-        filters = [
-            (self.standard_columns.get("province"), self.province_input.text().strip()),
-            (self.standard_columns.get("exam_center"), self.exam_center_input.text().strip()),
-            (self.standard_columns.get("exam_type"), self.exam_type_input.currentText().strip()),
-            (self.standard_columns.get("driving_school"), self.driving_school_input.text().strip()),
-            (self.standard_columns.get("permit"), self.permit_input.text().strip()),
-        ]
-        for col, value in filters:
-            if col and value:
-                where_clauses.append(f'TRIM("{col}") = ?')
-                params.append(value.strip())
+        month_col = self._derived_column("month")
+        year_col = self._derived_column("year")
+        if has_from:
+            where_clauses.append(f'("{year_col}" > ? OR ("{year_col}" = ? AND "{month_col}" >= ?))')
+        if has_to:
+            where_clauses.append(f'("{year_col}" < ? OR ("{year_col}" = ? AND "{month_col}" <= ?))')
+        where_clauses.extend(f'"{col}" = ?' for col in filter_columns)
 
         where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
         group_sql = ""
         if group != "None":
-            group_columns = self._group_columns(group)
             group_sql = " GROUP BY " + ", ".join([f'"{c}"' for c in group_columns])
 
         order_sql = f' ORDER BY "{order_by}" {order_dir}' if order_by else ""
 
-        limit = self.limit_input.value()
-        limit_sql = f" LIMIT {limit}" if limit > 0 else ""
+        if paged:
+            limit_sql = " LIMIT ? OFFSET ?"
+        else:
+            limit_sql = " LIMIT ?" if limited else ""
 
-        query = f"SELECT {select_sql} FROM exams {where_sql}{group_sql}{order_sql}{limit_sql}"
-        return query, params
+        return f"SELECT {select_sql} FROM exams {where_sql}{group_sql}{order_sql}{limit_sql}"
+
+    def _derived_column(self, field: str) -> Optional[str]:
+        """The indexed trimmed/integer column SQLite keeps for a standard column, when there is one."""
+        return self._derived_columns.get(field)
 
     def _selected_columns(self) -> List[str]:
         selected = []
@@ -389,34 +655,108 @@ class MainWindow(QMainWindow):
 
     def _group_columns(self, group_label: str) -> List[str]:
         if group_label == "Year":
-            return [c for c in [self.standard_columns.get("year")] if c]
+            return [c for c in [self._col_year] if c]
         if group_label == "Month and Year":
-            return [c for c in [self.standard_columns.get("year"), self.standard_columns.get("month")] if c]
+            return [c for c in [self._col_year, self._col_month] if c]
         if group_label == "Province":
-            return [c for c in [self.standard_columns.get("province")] if c]
+            return [c for c in [self._col_province] if c]
         if group_label == "Exam center":
-            return [c for c in [self.standard_columns.get("exam_center")] if c]
+            return [c for c in [self._col_exam_center] if c]
         if group_label == "Driving school":
-            return [c for c in [self.standard_columns.get("driving_school")] if c]
+            return [c for c in [self._col_driving_school] if c]
         return []
 
     def _apply_filters(self) -> None:
-        query_sql, params = self._build_query()
-        query = QSqlQuery(self.db)
-        query.prepare(query_sql)
-        for param in params:
-            query.addBindValue(param)
-        query.exec()
-        self.model.setQuery(query)
-
-        self.current_columns = []
-        self.current_headers = []
-        for i in range(self.model.record().count()):
-            header = self.model.headerData(i, Qt.Orientation.Horizontal)
-            self.current_headers.append(str(header))
-            self.current_columns.append(self.model.record().fieldName(i))
-        self._apply_header_labels()
+        self.page_index = 0
+        self._order_by = None
+        self._order_dir = "ASC"
+        self.total_rows = 0
+        self._row_count_ready = False
+        self._row_count_exact = True
+        # The unpaginated SQL feeds both the row count and the chart, so it is built once per apply.
+        self._result_query = self._build_query()
+        self._load_page()
+        if self.group_by.currentText() == "None":
+            self._request_row_count()
+        self._request_group_rows()
+
+    def _request_row_count(self) -> None:
+        """Count the ungrouped result only up to one row past the current page.
+
+        That is enough to enable Next without reading the whole result, and it is queued after the page
+        so the first rows never wait for it.
+        """
+        query_sql, params = self._result_query
+        probe = (self.page_index + 1) * self.page_size + 1
+        self._submit_query(
+            "count",
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM ({query_sql}) LIMIT ?)",
+            [*params, probe],
+            lambda columns, rows: self._on_row_count(columns, rows, probe),
+            cache=True,
+        )
 
+    def _on_row_count(self, _columns: List[str], rows: List[tuple], probe: Optional[int] = None) -> None:
+        self.total_rows = int(rows[0][0] or 0) if rows else 0
+        # Reaching the probe only proves there is another page; the real total is still unknown.
+        self._row_count_exact = probe is None or self.total_rows < probe
+        self._row_count_ready = True
+        self._update_page_controls()
+
+    def _page_count(self) -> int:
+        return max((self.total_rows + self.page_size - 1) // self.page_size, 1)
+
+    def _load_page(self) -> None:
+        query_sql, params = self._build_query(self._order_by, self._order_dir, page=self.page_index)
+        self._submit_query("page", query_sql, params, self._on_page_loaded, cache=True, stream=True)
+
+    def _on_page_loaded(
+        self, columns: List[str], rows: List[tuple], fetch: Optional[Callable[[int], None]] = None
+    ) -> None:
+        self.current_columns = columns
+        self.current_headers = self._header_labels(columns)
+        self.model.set_result(columns, self.current_headers, rows, fetch)
+        self._update_page_controls()
+
+    def _on_table_scrolled(self, value: int) -> None:
+        # Ask for the next chunk a screen ahead of the bottom instead of waiting for the view to reach it.
+        scroll_bar = self.table_view.verticalScrollBar()
+        if value >= scroll_bar.maximum() - scroll_bar.pageStep() and self.model.canFetchMore():
+            self.model.fetchMore()
+
+    def _update_page_controls(self) -> None:
+        if self._row_count_exact:
+            self.page_label.setText(f"Page {self.page_index + 1} of {self._page_count()} ({self.total_rows} rows)")
+        else:
+            self.page_label.setText(f"Page {self.page_index + 1} ({self.total_rows - 1}+ rows)")
+        self.prev_page_button.setEnabled(self.page_index > 0)
+        self.next_page_button.setEnabled(self.page_index + 1 < self._page_count())
+
+    def _previous_page(self) -> None:
+        if self.page_index > 0:
+            self.page_index -= 1
+            self._load_page()
+
+    def _next_page(self) -> None:
+        if self.page_index + 1 < self._page_count():
+            self.page_index += 1
+            self._load_page()
+            if not self._row_count_exact:
+                self._request_row_count()
+
+    def _request_group_rows(self) -> None:
+        """Load every grouped row for the chart; the table only ever holds one page of them."""
+        self._group_rows = []
+        if self.group_by.currentText() == "None":
+            self._render_chart()
+            return
+        query_sql, params = self._result_query
+        self._submit_query("chart", query_sql, params, self._on_group_rows, cache=True)
+
+    def _on_group_rows(self, _columns: List[str], rows: List[tuple]) -> None:
+        # The chart reads every grouped row, so their number is the row count and no COUNT query is needed.
+        self._group_rows = rows
+        self._on_row_count([], [(len(rows),)])
         self._render_chart()
 
     def _render_chart(self) -> None:
@@ -430,21 +770,13 @@ class MainWindow(QMainWindow):
             self.chart_view = None
             return
 
-        data = []
-        row_count = self.model.rowCount()
-        if row_count == 0:
+        if not self._group_rows:
             self.chart_layout.addWidget(QLabel("No data to display."))
             self.chart_view = None
             return
 
-        label_cols = self.model.record().count() - 1
-        for row in range(row_count):
-            labels = []
-            for col in range(label_cols):
-                labels.append(str(self.model.data(self.model.index(row, col))))
-            label = " / ".join(labels)
-            value = self.model.data(self.model.index(row, label_cols))
-            data.append((label, float(value or 0)))
+        # Grouped rows are the label columns followed by the total.
+        data = [(" / ".join(map(str, row[:-1])), float(row[-1] or 0)) for row in self._group_rows]
 
         chart = build_bar_chart(data, "Exam totals")
         self.chart_view = chart
@@ -455,23 +787,34 @@ class MainWindow(QMainWindow):
             return
         if logical_index >= len(self.current_columns):
             return
-        order_by = self.current_columns[logical_index]
-        order_dir = "ASC" if order == Qt.SortOrder.AscendingOrder else "DESC"
-        query_sql, params = self._build_query(order_by=order_by, order_dir=order_dir)
-        query = QSqlQuery(self.db)
-        query.prepare(query_sql)
-        for param in params:
-            query.addBindValue(param)
-        query.exec()
-        self.model.setQuery(query)
+        self._order_by = self.current_columns[logical_index]
+        self._order_dir = "ASC" if order == Qt.SortOrder.AscendingOrder else "DESC"
+        self.page_index = 0
+        if self._page_holds_whole_result():
+            rows = sorted(
+                self.model.rows(),
+                key=lambda row: _sql_sort_key(row[logical_index]),
+                reverse=self._order_dir == "DESC",
+            )
+            self.model.set_result(self.current_columns, self.current_headers, rows)
+            self._update_page_controls()
+            return
+        self._load_page()
+
+    def _page_holds_whole_result(self) -> bool:
+        """True when the loaded rows are every row of the result, so sorting them needs no query."""
+        if not self._row_count_ready or self._latest_requests.get("page") in self._pending_queries:
+            return False
+        if not self.model.is_exhausted():
+            return False
+        limit = self.limit_input.value()
+        return self.total_rows <= self.page_size and (limit <= 0 or self.total_rows < limit)
 
     def _export_table_pdf(self) -> None:
         path, _ = QFileDialog.getSaveFileName(self, "Save PDF", "", "PDF Files (*.pdf)")
         if not path:
             return
-        headers, rows = self._collect_table_data()
-        html = render_table_to_html(headers, rows, "Driving exams report")
-        export_html_to_pdf(html, path)
+        self._start_export(path)
 
     def _export_chart_pdf(self) -> None:
         path, _ = QFileDialog.getSaveFileName(self, "Save PDF", "", "PDF Files (*.pdf)")
@@ -488,86 +831,99 @@ class MainWindow(QMainWindow):
         path, _ = QFileDialog.getSaveFileName(self, "Save PDF", "", "PDF Files (*.pdf)")
         if not path:
             return
-        headers, rows = self._collect_table_data()
-        chart_base64 = self._chart_as_base64()
-        html = render_table_to_html(headers, rows, "Driving exams report", chart_base64=chart_base64)
-        export_html_to_pdf(html, path)
-
-    def _collect_table_data(self) -> Tuple[List[str], List[List[str]]]:
-        while self.model.canFetchMore():
-            self.model.fetchMore()
-            QApplication.processEvents()
-        column_count = self.model.columnCount()
-        row_count = self.model.rowCount()
-        headers = [self.model.headerData(i, Qt.Orientation.Horizontal) for i in range(column_count)]
-        rows = []
-        print(f"Exporting {row_count} rows and {column_count} columns...")
-        for row in range(row_count):
-            values = []
-            for col in range(column_count):
-                values.append(str(self.model.data(self.model.index(row, col))))
-            rows.append(values)
-            if (row + 1) % 1000 == 0 or row + 1 == row_count:
-                print(f"Collected {row + 1}/{row_count} rows for export...")
-                QApplication.processEvents()
-        return [str(h) for h in headers], rows
-
-    def _apply_header_labels(self) -> None:
-        mapping = {
-            self.standard_columns.get("year"): "Year",
-            self.standard_columns.get("month"): "Month",
-            self.standard_columns.get("province"): "Province",
-            self.standard_columns.get("exam_center"): "Exam center",
-            self.standard_columns.get("exam_type"): "Exam type",
-            self.standard_columns.get("driving_school"): "Driving school",
-            self.standard_columns.get("permit"): "Permit",
-            self.standard_columns.get("num_aptos"): "Num aptos",
-            self.standard_columns.get("num_no_aptos"): "Num no aptos",
+        self._start_export(path, self._chart_as_base64())
+
+    def _start_export(self, path: str, chart_base64: Optional[str] = None) -> None:
+        """Export the whole result on the thread pool while a progress dialog keeps the window responsive."""
+        query_sql, params = self._build_query(self._order_by, self._order_dir)
+        task = TableExportTask(
+            self.db.databaseName(),
+            query_sql,
+            params,
+            self._header_label_map,
+            "Driving exams report",
+            path,
+            chart_base64,
+        )
+        task.setAutoDelete(False)
+        progress = QProgressDialog("Exporting table...", "Cancel", 0, 0, self)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.canceled.connect(task.cancel)
+        task.signals.progress.connect(lambda rows: progress.setLabelText(f"Exporting table... {rows} rows read"))
+        task.signals.finished.connect(lambda _path: self._finish_export(progress))
+        task.signals.failed.connect(lambda message: self._finish_export(progress, message))
+        self._export_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def _finish_export(self, progress: QProgressDialog, error: Optional[str] = None) -> None:
+        progress.reset()
+        self._export_task = None
+        if error:
+            QMessageBox.warning(self, "Export PDF", f"Export failed: {error}")
+
+    def _load_standard_columns(self) -> None:
+        # Header labels only change with the columns, so they are mapped here rather than per query.
+        standard = find_standard_columns(get_table_columns(self.db, "exams"))
+        self.standard_columns = standard
+        self._query_templates = {}
+        self._col_year = standard.get("year")
+        self._col_month = standard.get("month")
+        self._col_province = standard.get("province")
+        self._col_exam_center = standard.get("exam_center")
+        self._col_exam_type = standard.get("exam_type")
+        self._col_driving_school = standard.get("driving_school")
+        self._col_permit = standard.get("permit")
+        self._col_aptos = standard.get("num_aptos")
+        self._col_no_aptos = standard.get("num_no_aptos")
+        self._derived_columns = {field: names[0] for field, names in DERIVED_COLUMNS.items() if standard.get(field)}
+        self._header_label_map = {
+            self._col_year: "Year",
+            self._col_month: "Month",
+            self._col_province: "Province",
+            self._col_exam_center: "Exam center",
+            self._col_exam_type: "Exam type",
+            self._col_driving_school: "Driving school",
+            self._col_permit: "Permit",
+            self._col_aptos: "Num aptos",
+            self._col_no_aptos: "Num no aptos",
             "total_exams": "Total exams",
         }
-        for col_index in range(self.model.columnCount()):
-            field = self.model.record().fieldName(col_index)
-            label = mapping.get(field)
-            if label:
-                self.model.setHeaderData(col_index, Qt.Orientation.Horizontal, label)
-
-    def _refresh_year_month_ranges(self) -> None:
-        year_col = self.standard_columns.get("year")
-        month_col = self.standard_columns.get("month")
+
+    def _header_labels(self, columns: List[str]) -> List[str]:
+        mapping = self._header_label_map
+        return [mapping.get(column, column) for column in columns]
+
+    def _refresh_year_month_ranges(self, on_ready: Optional[Callable[[], None]] = None) -> None:
+        year_col = self._derived_column("year")
         if not year_col:
+            if on_ready is not None:
+                on_ready()
             return
-        query = QSqlQuery(self.db)
-        query.exec(f'SELECT MIN(CAST("{year_col}" AS INTEGER)), MAX(CAST("{year_col}" AS INTEGER)) FROM exams')
-        if not query.next():
-            return
-        min_year = query.value(0)
-        max_year = query.value(1)
-        if min_year is None or max_year is None:
-            return
+        # Separate subqueries let SQLite read each end of the (year_i, month_i) index instead of scanning.
+        self._submit_query(
+            "year_range",
+            f'SELECT (SELECT MIN("{year_col}") FROM exams), (SELECT MAX("{year_col}") FROM exams)',
+            [],
+            lambda columns, rows: self._on_year_range(columns, rows, on_ready),
+        )
+
+    def _on_year_range(
+        self, _columns: List[str], rows: List[tuple], on_ready: Optional[Callable[[], None]] = None
+    ) -> None:
+        if rows and None not in rows[0]:
+            self._set_year_range(*rows[0])
+        if on_ready is not None:
+            on_ready()
+
+    def _set_year_range(self, min_year: Any, max_year: Any) -> None:
         self.from_year.setRange(int(min_year), int(max_year))
         self.to_year.setRange(int(min_year), int(max_year))
         self.from_year.setValue(int(min_year))
         self.to_year.setValue(int(max_year))
-
-        if not month_col:
-            return
-        query = QSqlQuery(self.db)
-        query.exec(f'SELECT DISTINCT CAST("{month_col}" AS INTEGER) FROM exams ORDER BY CAST("{month_col}" AS INTEGER)')
-        months = [""]
-        while query.next():
-            value = query.value(0)
-            if value is None:
-                continue
-            month = int(value)
-            if 1 <= month <= 12:
-                months.append(str(month))
-        if len(months) > 1:
-            self.from_month.clear()
-            self.to_month.clear()
-            self.from_month.addItems(months)
-            self.to_month.addItems(months)
-            self.from_month.setCurrentText(months[1])
-            self.to_month.setCurrentText(months[-1])
+        # Months are always 1-12, so the combos are fixed and the range simply spans the whole year.
+        if self._derived_column("month"):
+            self.from_month.setCurrentText("1")
+            self.to_month.setCurrentText("12")
 
     def _chart_as_base64(self) -> Optional[str]:
         if not self.chart_view:
@@ -577,5 +933,6 @@ class MainWindow(QMainWindow):
         buffer = QByteArray()
         qbuffer = QBuffer(buffer)
         qbuffer.open(QBuffer.OpenModeFlag.WriteOnly)
-        image.save(qbuffer, "PNG")
+        # Qt turns PNG quality into the deflate level as (100 - quality) * 9 / 91: 80 gives level 1.
+        image.save(qbuffer, "PNG", CHART_PNG_QUALITY)
         return base64.b64encode(bytes(buffer)).decode("ascii")
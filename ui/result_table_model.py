@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from typing import Any, Callable, List, Optional, Sequence
+
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+FETCH_CHUNK = 200
+
+
+class ResultTableModel(QAbstractTableModel):
+    """Read-only table over rows fetched from the database.
+
+    A result can arrive incomplete: further rows are asked for through the fetch callback
+    when the view needs them, and added with append_rows.
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self._columns: List[str] = []
+        self._headers: List[str] = []
+        self._rows: List[Sequence[Any]] = []
+        self._exhausted = True
+        self._fetching = False
+        self._fetch: Optional[Callable[[int], None]] = None
+
+    def set_result(
+        self,
+        columns: List[str],
+        headers: List[str],
+        rows: List[Sequence[Any]],
+        fetch: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        self.beginResetModel()
+        self._columns = columns
+        self._headers = headers
+        self._rows = rows
+        self._fetch = fetch
+        self._exhausted = fetch is None
+        self._fetching = False
+        self.endResetModel()
+
+    def append_rows(self, rows: List[Sequence[Any]], exhausted: bool) -> None:
+        self._fetching = False
+        self._exhausted = exhausted
+        if exhausted:
+            self._fetch = None
+        if not rows:
+            return
+        start = len(self._rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def is_exhausted(self) -> bool:
+        return self._exhausted
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and not self._exhausted and not self._fetching
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        if not self.canFetchMore(parent):
+            return
+        self._fetching = True
+        self._fetch(FETCH_CHUNK)
+
+    def columns(self) -> List[str]:
+        return self._columns
+
+    def rows(self) -> List[Sequence[Any]]:
+        return self._rows
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._columns)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Optional[Any]:
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        return self._rows[index.row()][index.column()]
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            if 0 <= section < len(self._headers):
+                return self._headers[section]
+        return super().headerData(section, orientation, role)